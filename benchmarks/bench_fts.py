@@ -0,0 +1,89 @@
+"""Замер задержки /find (search_events_db) на большом индексе.
+
+Запуск: python benchmarks/bench_fts.py --events 1000000 --chats 2000
+БД создаётся во временной директории, data/bot.db не трогается.
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+WORDS = [
+    "планёрка", "ретро", "демо", "синк", "созвон", "обзор", "релиз", "интервью",
+    "бюджет", "команда", "продукт", "дизайн", "бэкенд", "фронтенд", "аналитика",
+    "standup", "review", "sync", "planning", "roadmap", "incident", "onboarding",
+]
+
+
+def fill(events: int, chats: int, chunk: int = 10000):
+    start_at = datetime.now(timezone.utc) + timedelta(days=1)
+    chat_ids = [-1000000000000 - i for i in range(chats)]
+    per_chat = events // chats
+
+    t0 = time.perf_counter()
+    for chat_id in chat_ids:
+        batch = []
+        for i in range(per_chat):
+            batch.append({
+                "title": " ".join(random.sample(WORDS, 3)),
+                "location": f"https://dion.vc/event/room{i % 50}",
+                "start_at": start_at + timedelta(minutes=i),
+            })
+            if len(batch) >= chunk:
+                db.bulk_insert_events(chat_id, batch)
+                batch = []
+        db.bulk_insert_events(chat_id, batch)
+
+    return chat_ids, time.perf_counter() - t0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "bench.db"
+    db.init_db()
+
+    chat_ids, fill_time = fill(args.events, args.chats)
+    print(f"indexed {args.events} events in {args.chats} chats: {fill_time:.1f}s")
+
+    for label, make_query in [
+        ("one word", lambda: random.choice(WORDS)),
+        ("prefix", lambda: random.choice(WORDS)[:3]),
+        ("two words", lambda: " ".join(random.sample(WORDS, 2))),
+        ("location", lambda: f"room{random.randrange(50)}"),
+    ]:
+        timings = []
+        for _ in range(args.queries):
+            chat_id = random.choice(chat_ids)
+            text = make_query()
+            t0 = time.perf_counter()
+            db.search_events_db(chat_id, text, limit=11, offset=0)
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        print(
+            f"{label:>10}: p50={statistics.median(timings):.2f}ms "
+            f"p95={percentile(timings, 0.95):.2f}ms p99={percentile(timings, 0.99):.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Замер пропускной способности записи: коммит на каждую операцию против очереди
+отложенной записи (db.write_queues) при конкурентных хендлерах.
+
+Запуск: python benchmarks/bench_write_queue.py --handlers 50 --writes 200
+БД создаётся во временной директории, data/bot.db не трогается.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import db  # noqa: E402
+
+
+def add_notification_sync(event_id: int, job_name: str) -> int:
+    # прежний вариант add_notification_db: отдельное соединение и коммит на каждую запись
+    conn = db.get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO notifications(event_id, reminder, notify_at, job_name, status)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (event_id, "bench", datetime.now(timezone.utc), job_name, "scheduled"),
+    )
+    conn.commit()
+    notification_id = cur.lastrowid
+    conn.close()
+
+    return notification_id
+
+
+async def handler_sync(event_id: int, writes: int):
+    for i in range(writes):
+        add_notification_sync(event_id, f"sync_{event_id}_{i}")
+        await asyncio.sleep(0)
+
+
+async def handler_queue(event_id: int, writes: int):
+    for i in range(writes):
+        await db.add_notification_db(event_id, "bench", datetime.now(timezone.utc), f"queue_{event_id}_{i}")
+
+
+async def run(handler, event_ids, writes: int) -> float:
+    t0 = time.perf_counter()
+    await asyncio.gather(*(handler(event_id, writes) for event_id in event_ids))
+    elapsed = time.perf_counter() - t0
+    return len(event_ids) * writes / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handlers", type=int, default=50)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--max-batch", type=int, default=db.write_queues[0].max_batch)
+    parser.add_argument("--max-delay-ms", type=float, default=db.write_queues[0].max_delay * 1000)
+    args = parser.parse_args()
+
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "bench.db"
+    db.init_db()
+    db.write_queues[0].max_batch = args.max_batch
+    db.write_queues[0].max_delay = args.max_delay_ms / 1000
+
+    start_at = datetime.now(timezone.utc) + timedelta(days=1)
+    event_ids = [db.add_event_db(1, f"event {i}", "", start_at) for i in range(args.handlers)]
+
+    sync_rate = await run(handler_sync, event_ids, args.writes)
+    print(f"commit per write: {sync_rate:,.0f} writes/s")
+
+    queue_rate = await run(handler_queue, event_ids, args.writes)
+    print(f"write queue:      {queue_rate:,.0f} writes/s ({queue_rate / sync_rate:.1f}x)")
+
+    await db.stop_write_queues()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
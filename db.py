@@ -1,29 +1,219 @@
+import asyncio
+import heapq
+import os
+import re
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Sequence, Mapping
+from typing import Callable, Sequence, Mapping
+from dotenv import load_dotenv
 
 
-DB_PATH = Path(__file__).parent / "data" / "bot.db"
+load_dotenv()  # db импортируется раньше, чем main.py читает .env
+
+# BOT_DB_PATH - отдельная БД, например, для нагрузочного теста
+DB_PATH = Path(os.getenv("BOT_DB_PATH") or Path(__file__).parent / "data" / "bot.db")
 DB_PATH.parent.mkdir(exist_ok=True)
 
+# BOT_DB_SHARDS - на сколько файлов БД делить чаты (чат живёт в шарде chat_id % DB_SHARDS).
+# Число шардов выбирается до первого запуска: при его смене чаты переедут в другие файлы.
+DB_SHARDS = int(os.getenv("BOT_DB_SHARDS") or 1)
+
+
+def shard_path(shard: int) -> Path:
+    # нулевой шард - прежний bot.db, остальные рядом: bot.1.db, bot.2.db, ...
+    if shard == 0:
+        return DB_PATH
+    return DB_PATH.with_name(f"{DB_PATH.stem}.{shard}{DB_PATH.suffix}")
+
+
+def shard_for_chat(chat_id: int) -> int:
+    return chat_id % DB_SHARDS
+
+
+def shard_for_id(row_id: int) -> int:
+    # id событий и уведомлений в шарде k дают остаток k (см. _next_id)
+    return row_id % DB_SHARDS
+
 
-def get_connection():
+def _next_id(table: str, shard: int) -> str:
+    # следующий id строки шарда: AUTOINCREMENT с шагом DB_SHARDS, начиная с номера шарда,
+    # так id остаются уникальными между шардами. При одном шарде это обычный AUTOINCREMENT
+    return f"(SELECT IFNULL(MAX(seq), {shard}) FROM sqlite_sequence WHERE name = '{table}') + {DB_SHARDS}"
+
+
+def _fan_out(func: Callable[[int], object]) -> list:
+    """Выполняет func(shard) на всех шардах параллельно, результаты - в порядке шардов."""
+    if DB_SHARDS == 1:
+        return [func(0)]
+    # sqlite3 отпускает GIL на время запроса, так что потоки действительно параллельны
+    with ThreadPoolExecutor(max_workers=DB_SHARDS) as pool:
+        return list(pool.map(func, range(DB_SHARDS)))
+
+
+def get_connection(shard: int = 0):
     # check_same_thread=False — если будешь использовать соединение из разных хендлеров,
     # но лучше создавать новое подключение на запрос.
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(shard_path(shard))
     conn.row_factory = sqlite3.Row
 
     return conn
 
 
+class WriteQueue:
+    """Очередь отложенной записи: одна задача-писатель собирает изменения в пачки
+    и коммитит их одной транзакцией (group commit).
+
+    submit() возвращает результат операции (rowcount или lastrowid) только после
+    коммита пачки, т.е. await означает, что запись уже на диске. После stop()
+    очередь новых записей не принимает, а если писатель не смог открыть БД, все
+    записи получают эту ошибку.
+    """
+
+    def __init__(self, shard: int = 0, max_batch: int = 500, max_delay: float = 0.005):
+        self.shard = shard
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = None
+        self._task = None
+        self._stopped = False
+        self._error = None
+
+    def start(self):
+        if self._stopped:
+            raise RuntimeError("WriteQueue is stopped")
+        if self._error is not None:
+            raise self._error
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # дожидаемся записи всего, что уже поставлено в очередь
+        self._stopped = True
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def submit(self, sql: str, params: Sequence = (), result: str = "rowcount"):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sql, params, result, future))
+        return await future
+
+    def _drain(self, batch: list) -> bool:
+        # забираем из очереди всё, что уже есть, но не больше max_batch
+        while len(batch) < self.max_batch and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is None:
+                return True
+            batch.append(item)
+        return False
+
+    async def _run(self):
+        try:
+            conn = sqlite3.connect(shard_path(self.shard), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA foreign_keys = ON")
+        except sqlite3.Error as e:
+            # без соединения писать некуда: ошибку получают уже поставленные и все будущие записи
+            self._error = e
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    item[3].set_exception(e)
+            return
+
+        stopping = False
+        try:
+            while not stopping:
+                item = await self._queue.get()
+                if item is None:
+                    break
+
+                batch = [item]
+                stopping = self._drain(batch)
+                if not stopping and len(batch) < self.max_batch:
+                    # даём конкурентным хендлерам пару миллисекунд добавить свои записи
+                    await asyncio.sleep(self.max_delay)
+                    stopping = self._drain(batch)
+
+                try:
+                    results = await asyncio.to_thread(self._apply, conn, batch)
+                except Exception as e:
+                    results = [e] * len(batch)
+
+                for (_, _, _, future), res in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(res, Exception):
+                        future.set_exception(res)
+                    else:
+                        future.set_result(res)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _apply(conn, batch: list) -> list:
+        results = []
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        try:
+            for sql, params, result, _ in batch:
+                # ошибка одного запроса откатывает только его (до savepoint), остальные пишутся
+                cur.execute("SAVEPOINT op")
+                try:
+                    cur.execute(sql, params)
+                    results.append(cur.lastrowid if result == "lastrowid" else cur.rowcount)
+                except sqlite3.Error as e:
+                    # SQLITE_FULL, IOERR и т.п. могут откатить всю транзакцию - тогда
+                    # ошибку получает вся пачка, а не только этот запрос
+                    if not conn.in_transaction:
+                        raise
+                    cur.execute("ROLLBACK TO op")
+                    results.append(e)
+                cur.execute("RELEASE op")
+            cur.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+        return results
+
+
+# у каждого шарда свой писатель
+write_queues = [WriteQueue(shard) for shard in range(DB_SHARDS)]
+
+
+def start_write_queues():
+    for queue in write_queues:
+        queue.start()
+
+
+async def stop_write_queues():
+    await asyncio.gather(*(queue.stop() for queue in write_queues))
+
+
 def init_db(reset: bool = False):
-    conn = get_connection()
+    # шарды инициализируются параллельно
+    _fan_out(lambda shard: _init_shard(shard, reset))
+
+
+def _init_shard(shard: int, reset: bool):
+    conn = get_connection(shard)
+    # WAL: читатели не блокируют писателя и наоборот
+    conn.execute("PRAGMA journal_mode = WAL")
     conn.execute("PRAGMA foreign_keys = ON")
     cur = conn.cursor()
     if reset:
         cur.execute("DROP TABLE IF EXISTS notifications;")
+        cur.execute("DROP TABLE IF EXISTS events_fts;")
         cur.execute("DROP TABLE IF EXISTS events;")
+        cur.execute("DROP TABLE IF EXISTS chat_settings;")
 
     # таблица событий
     cur.execute(
@@ -55,6 +245,66 @@ def init_db(reset: bool = False):
         """
     )
 
+    # настройки чатов: утренний дайджест и режим "только дайджест" без напоминаний
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_settings (
+            chat_id INTEGER PRIMARY KEY,
+            digest_enabled BOOLEAN NOT NULL DEFAULT 0 CHECK (digest_enabled IN (0, 1)),
+            digest_only BOOLEAN NOT NULL DEFAULT 0 CHECK (digest_only IN (0, 1))
+        );
+        """
+    )
+
+    # полнотекстовый индекс по названию и месту события (external content над events),
+    # chat_id тоже индексируется, чтобы поиск сразу сужался до одного чата
+    fts_exists = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events_fts'"
+    ).fetchone()
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+            title,
+            location,
+            chat_id,
+            content='events',
+            content_rowid='id'
+        );
+        """
+    )
+
+    # триггеры держат индекс в синхронизации с events при любых вставках/удалениях
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_ai AFTER INSERT ON events BEGIN
+            INSERT INTO events_fts(rowid, title, location, chat_id)
+            VALUES (new.id, new.title, new.location, new.chat_id);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_ad AFTER DELETE ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, title, location, chat_id)
+            VALUES ('delete', old.id, old.title, old.location, old.chat_id);
+        END;
+        """
+    )
+    cur.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS events_fts_au AFTER UPDATE OF title, location, chat_id ON events BEGIN
+            INSERT INTO events_fts(events_fts, rowid, title, location, chat_id)
+            VALUES ('delete', old.id, old.title, old.location, old.chat_id);
+            INSERT INTO events_fts(rowid, title, location, chat_id)
+            VALUES (new.id, new.title, new.location, new.chat_id);
+        END;
+        """
+    )
+
+    # индекс появился на уже заполненной БД - строим его по существующим событиям
+    if not fts_exists:
+        cur.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
     # удаляем просроченные события
     cur.execute(
         "DELETE FROM events WHERE start_at < DATETIME('now')"
@@ -70,12 +320,13 @@ def init_db(reset: bool = False):
 
 
 def add_event_db(chat_id: int, title: str, location: str, start_at: datetime) -> int:
-    conn = get_connection()
+    shard = shard_for_chat(chat_id)
+    conn = get_connection(shard)
     cur = conn.cursor()
     cur.execute(
-        """
-        INSERT INTO events (chat_id, title, location, start_at, created_at, is_scheduled)
-        VALUES (?, ?, ?, ?, ?, ?)
+        f"""
+        INSERT INTO events (id, chat_id, title, location, start_at, created_at, is_scheduled)
+        VALUES ({_next_id("events", shard)}, ?, ?, ?, ?, ?, ?)
         """,
         (chat_id, title, location, start_at.astimezone(timezone.utc), datetime.now(tz=timezone.utc).isoformat(), 0),
     )
@@ -87,21 +338,46 @@ def add_event_db(chat_id: int, title: str, location: str, start_at: datetime) ->
 
 
 def delete_expired_events():
-    conn = get_connection()
-    # для каскадного удаления
-    conn.execute("PRAGMA foreign_keys = ON")
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM events WHERE start_at < DATETIME('now')",
-    )
-    conn.commit()
-    deleted = cur.rowcount
-    conn.close()
-    return deleted
+    def delete_shard(shard: int) -> int:
+        conn = get_connection(shard)
+        # для каскадного удаления
+        conn.execute("PRAGMA foreign_keys = ON")
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM events WHERE start_at < DATETIME('now')",
+        )
+        conn.commit()
+        deleted = cur.rowcount
+        conn.close()
+        return deleted
+
+    return sum(_fan_out(delete_shard))
+
+
+def delete_expired_digest_only_events():
+    # прошедшие события чатов "только дайджест": напоминаний у них нет, удалять их больше некому
+    def delete_shard(shard: int) -> int:
+        conn = get_connection(shard)
+        # для каскадного удаления
+        conn.execute("PRAGMA foreign_keys = ON")
+        cur = conn.cursor()
+        cur.execute(
+            """
+            DELETE FROM events
+            WHERE start_at < DATETIME('now')
+              AND chat_id IN (SELECT chat_id FROM chat_settings WHERE digest_only = 1)
+            """,
+        )
+        conn.commit()
+        deleted = cur.rowcount
+        conn.close()
+        return deleted
+
+    return sum(_fan_out(delete_shard))
 
 
 def get_event_by_id(event_id: int):
-    conn = get_connection()
+    conn = get_connection(shard_for_id(event_id))
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
     cur.execute(
@@ -116,25 +392,23 @@ def get_event_by_id(event_id: int):
     return row
 
 
-def add_notification_db(event_id: int, reminder: str, notify_at: int, job_name: str) -> int:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        '''
-        INSERT INTO notifications(event_id, reminder, notify_at, job_name, status)
-        VALUES (?, ?, ?, ?, ?)
+async def add_notification_db(event_id: int, reminder: str, notify_at: int, job_name: str) -> int:
+    # уведомление живёт в шарде своего события
+    shard = shard_for_id(event_id)
+    notification_id = await write_queues[shard].submit(
+        f'''
+        INSERT INTO notifications(id, event_id, reminder, notify_at, job_name, status)
+        VALUES ({_next_id("notifications", shard)}, ?, ?, ?, ?, ?)
         ''',
         (event_id, reminder, notify_at, job_name, "scheduled"),
+        result="lastrowid",
     )
-    conn.commit()
-    notification_id = cur.lastrowid
-    conn.close()
 
     return notification_id
 
 
 def get_notification_by_id(notification_id: int):
-    conn = get_connection()
+    conn = get_connection(shard_for_id(notification_id))
     cur = conn.cursor()
     cur.execute(
         """
@@ -154,24 +428,19 @@ def get_notification_by_id(notification_id: int):
     return row
 
 
-def update_event_status_by_id(event_id: int, is_scheduled: int):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+async def update_event_status_by_id(event_id: int, is_scheduled: int):
+    updated = await write_queues[shard_for_id(event_id)].submit(
         """
         UPDATE events SET is_scheduled = ? WHERE id = ?
         """,
         (is_scheduled, event_id,),
     )
-    conn.commit()
-    updated = cur.rowcount
-    conn.close()
 
     return updated
 
 
 def get_notifications_by_event_id(event_id: int):
-    conn = get_connection()
+    conn = get_connection(shard_for_id(event_id))
     cur = conn.cursor()
     cur.execute(
         """
@@ -189,45 +458,47 @@ def get_notifications_by_event_id(event_id: int):
     return rows
 
 
-def get_notification_by_job(job_name):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT
-            *
-        FROM
-            notifications
-        INNER JOIN
-            events ON notifications.event_id = events.id
-        WHERE notifications.job_name = ?
-        """,
-        (job_name,),
-    )
-    row = cur.fetchone()
-    conn.close()
+def get_notification_by_job(job_name, chat_id: int | None = None):
+    # без chat_id ищем по всем шардам
+    def get_shard(shard: int):
+        conn = get_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                *
+            FROM
+                notifications
+            INNER JOIN
+                events ON notifications.event_id = events.id
+            WHERE notifications.job_name = ?
+            """,
+            (job_name,),
+        )
+        row = cur.fetchone()
+        conn.close()
 
-    return row
+        return row
 
+    if chat_id is not None:
+        return get_shard(shard_for_chat(chat_id))
 
-def update_notification_by_id(id, job_name, status):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    return next((row for row in _fan_out(get_shard) if row is not None), None)
+
+
+async def update_notification_by_id(id, job_name, status):
+    updated = await write_queues[shard_for_id(id)].submit(
         """
         UPDATE notifications SET job_name = ?, status = ? WHERE id = ?
         """,
         (job_name, status, id),
     )
-    conn.commit()
-    updated = cur.rowcount
-    conn.close()
 
     return updated
 
 
 def delete_event_by_id(id: int) -> int:
-    conn = get_connection()
+    conn = get_connection(shard_for_id(id))
     # для каскадного удаления
     conn.execute("PRAGMA foreign_keys = ON")
     cur = conn.cursor()
@@ -241,46 +512,52 @@ def delete_event_by_id(id: int) -> int:
     return deleted
 
 
-def delete_notification_by_job(job_name):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM notifications WHERE job_name = ?",
-        (job_name,),
-    )
-    conn.commit()
-    deleted = cur.rowcount
-    conn.close()
-    return deleted
+async def delete_notification_by_job(job_name, chat_id: int | None = None):
+    # без chat_id удаляем во всех шардах
+    shards = [shard_for_chat(chat_id)] if chat_id is not None else range(DB_SHARDS)
+    deleted = await asyncio.gather(*(
+        write_queues[shard].submit(
+            "DELETE FROM notifications WHERE job_name = ?",
+            (job_name,),
+        )
+        for shard in shards
+    ))
+    return sum(deleted)
 
 
 def delete_all_events():
-    conn = get_connection()
-    conn.execute("PRAGMA foreign_keys = ON")
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM events",
-    )
-    conn.commit()
-    deleted = cur.rowcount
-    conn.close()
-    return deleted
+    def delete_shard(shard: int) -> int:
+        conn = get_connection(shard)
+        conn.execute("PRAGMA foreign_keys = ON")
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM events",
+        )
+        conn.commit()
+        deleted = cur.rowcount
+        conn.close()
+        return deleted
+
+    return sum(_fan_out(delete_shard))
 
 
 def delete_all_notifications():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM notifications",
-    )
-    conn.commit()
-    deleted = cur.rowcount
-    conn.close()
-    return deleted
+    def delete_shard(shard: int) -> int:
+        conn = get_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM notifications",
+        )
+        conn.commit()
+        deleted = cur.rowcount
+        conn.close()
+        return deleted
+
+    return sum(_fan_out(delete_shard))
 
 
 def get_events_for_chat_db(chat_id: int):
-    conn = get_connection()
+    conn = get_connection(shard_for_chat(chat_id))
     cur = conn.cursor()
     cur.execute(
         "SELECT * FROM events WHERE chat_id = ? ORDER BY start_at",
@@ -292,13 +569,42 @@ def get_events_for_chat_db(chat_id: int):
     return rows
 
 
-def get_unschedule_events():
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
+def _fts_query(text: str) -> str:
+    # каждое слово - отдельная фраза с префиксным поиском, чтобы пользовательский ввод
+    # не разбирался как синтаксис FTS5 (AND, NEAR, кавычки, * и т.п.)
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def _fts_chat_filter(chat_id: int) -> str:
+    # unicode61 не считает "-" частью токена, поэтому у групп (-100...) ищем модуль id,
+    # точное совпадение chat_id добирается условием в WHERE
+    return f'chat_id : "{abs(chat_id)}"'
+
+
+def search_events_db(chat_id: int, text: str, limit: int = 10, offset: int = 0):
+    """Ищет события чата по названию и месту, лучшие совпадения первыми."""
+    query = _fts_query(text)
+    if not query:
+        return []
+    # слова пользователя ищем только в названии и месте, иначе префикс id чата совпал бы со всеми событиями
+    query = f"{_fts_chat_filter(chat_id)} AND ({{title location}} : ({query}))"
+
+    conn = get_connection(shard_for_chat(chat_id))
     cur = conn.cursor()
     cur.execute(
-        "SELECT * FROM events WHERE is_scheduled = ? ORDER BY start_at",
-        (0,),
+        """
+        SELECT
+            events.*
+        FROM
+            events_fts
+        INNER JOIN
+            events ON events.id = events_fts.rowid
+        WHERE events_fts MATCH ? AND events.chat_id = ?
+        ORDER BY bm25(events_fts, 10.0, 5.0, 0.0), events.start_at
+        LIMIT ? OFFSET ?
+        """,
+        (query, chat_id, limit, offset),
     )
     rows = cur.fetchall()
     conn.close()
@@ -306,19 +612,40 @@ def get_unschedule_events():
     return rows
 
 
+def get_unschedule_events():
+    def get_shard(shard: int):
+        conn = get_connection(shard)
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM events WHERE is_scheduled = ? ORDER BY start_at",
+            (0,),
+        )
+        rows = cur.fetchall()
+        conn.close()
+
+        return rows
+
+    # шарды читаются параллельно, уже отсортированные списки сливаются по start_at
+    return list(heapq.merge(*_fan_out(get_shard), key=lambda row: row["start_at"]))
+
+
 def set_all_events_unscheduled():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        UPDATE events SET is_scheduled = 0
-        """,
-    )
-    conn.commit()
-    updated = cur.rowcount
-    conn.close()
+    def update_shard(shard: int) -> int:
+        conn = get_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE events SET is_scheduled = 0
+            """,
+        )
+        conn.commit()
+        updated = cur.rowcount
+        conn.close()
 
-    return updated
+        return updated
+
+    return sum(_fan_out(update_shard))
 
 
 def bulk_insert_events(chat_id: int, events: Sequence[Mapping]) -> int:
@@ -331,13 +658,14 @@ def bulk_insert_events(chat_id: int, events: Sequence[Mapping]) -> int:
         # здесь можно сделать парсинг/валидацию даты
         rows.append((chat_id, e["title"], e["location"], e["start_at"], datetime.now(tz=timezone.utc).isoformat(), 0))
 
-    conn = get_connection()
+    shard = shard_for_chat(chat_id)
+    conn = get_connection(shard)
     cur = conn.cursor()
     try:
         cur.executemany(
-            """
-            INSERT INTO events (chat_id, title, location, start_at, created_at, is_scheduled)
-            VALUES (?, ?, ?, ?, ?, ?)
+            f"""
+            INSERT INTO events (id, chat_id, title, location, start_at, created_at, is_scheduled)
+            VALUES ({_next_id("events", shard)}, ?, ?, ?, ?, ?, ?)
             """,
             rows,
         )
@@ -345,3 +673,153 @@ def bulk_insert_events(chat_id: int, events: Sequence[Mapping]) -> int:
         return cur.rowcount  # может быть -1 в sqlite, можно просто len(rows)
     finally:
         conn.close()
+
+
+def set_chat_digest_db(chat_id: int, digest_enabled: int, digest_only: int) -> int:
+    conn = get_connection(shard_for_chat(chat_id))
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO chat_settings (chat_id, digest_enabled, digest_only)
+        VALUES (?, ?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET
+            digest_enabled = excluded.digest_enabled,
+            digest_only = excluded.digest_only
+        """,
+        (chat_id, digest_enabled, digest_only),
+    )
+    conn.commit()
+    updated = cur.rowcount
+    conn.close()
+
+    return updated
+
+
+def get_chat_settings_db(chat_id: int):
+    conn = get_connection(shard_for_chat(chat_id))
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT * FROM chat_settings WHERE chat_id = ?",
+        (chat_id,),
+    )
+    row = cur.fetchone()
+    conn.close()
+
+    return row
+
+
+def get_digest_only_chats_db() -> set:
+    def get_shard(shard: int) -> set:
+        conn = get_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT chat_id FROM chat_settings WHERE digest_only = 1",
+        )
+        chat_ids = {row["chat_id"] for row in cur.fetchall()}
+        conn.close()
+
+        return chat_ids
+
+    return set().union(*_fan_out(get_shard))
+
+
+def get_digest_events_db(start_at: datetime, end_at: datetime):
+    """События всех чатов с включённым дайджестом за период, одним запросом на шард,
+    сгруппированные по chat_id."""
+    def get_shard(shard: int):
+        conn = get_connection(shard)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT
+                events.*
+            FROM
+                events
+            INNER JOIN
+                chat_settings ON chat_settings.chat_id = events.chat_id
+            WHERE chat_settings.digest_enabled = 1
+                AND events.start_at >= ? AND events.start_at < ?
+            ORDER BY events.chat_id, events.start_at
+            """,
+            (start_at.astimezone(timezone.utc), end_at.astimezone(timezone.utc)),
+        )
+        rows = cur.fetchall()
+        conn.close()
+
+        return rows
+
+    # чат целиком лежит в одном шарде, поэтому после слияния группы не перемешиваются
+    return list(heapq.merge(*_fan_out(get_shard), key=lambda row: (row["chat_id"], row["start_at"])))
+
+
+def delete_notifications_for_chat_db(chat_id: int) -> int:
+    conn = get_connection(shard_for_chat(chat_id))
+    cur = conn.cursor()
+    cur.execute(
+        """
+        DELETE FROM notifications
+        WHERE event_id IN (SELECT id FROM events WHERE chat_id = ?)
+        """,
+        (chat_id,),
+    )
+    conn.commit()
+    deleted = cur.rowcount
+    conn.close()
+    return deleted
+
+
+def set_chat_events_unscheduled_db(chat_id: int) -> int:
+    conn = get_connection(shard_for_chat(chat_id))
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE events SET is_scheduled = 0 WHERE chat_id = ?",
+        (chat_id,),
+    )
+    conn.commit()
+    updated = cur.rowcount
+    conn.close()
+
+    return updated
+
+
+def backup_db(backup_dir: Path, keep: int = 3) -> list:
+    """Онлайн-бэкап всех шардов через SQLite backup API, возвращает пути копий.
+
+    Каждый шард копируется за один шаг из снимка WAL: запись в БД при этом не
+    блокируется, а коммиты других соединений не перезапускают копирование.
+    Блокирующая функция - из бота её вызывают через asyncio.to_thread.
+    """
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    def backup_shard(shard: int) -> Path:
+        source_path = shard_path(shard)
+        target = backup_dir / f"{source_path.stem}-{stamp}{source_path.suffix}"
+        tmp = target.with_name(target.name + ".tmp")
+
+        source = sqlite3.connect(source_path)
+        dest = sqlite3.connect(tmp)
+        try:
+            try:
+                # копирование по частям начинается заново после каждого чужого коммита и под
+                # постоянной записью может не закончиться никогда, поэтому копируем за один шаг
+                source.backup(dest, pages=-1)
+            finally:
+                dest.close()
+                source.close()
+        except Exception:
+            # недописанный .tmp не оставляем
+            tmp.unlink(missing_ok=True)
+            raise
+        # готовый файл появляется атомарно, недописанных копий в backup_dir не бывает
+        tmp.replace(target)
+
+        # оставляем keep последних копий шарда, но не меньше только что сделанной
+        copies = sorted(backup_dir.glob(f"{source_path.stem}-*{source_path.suffix}"))
+        for old in copies[:-max(keep, 1)]:
+            old.unlink()
+
+        return target
+
+    return _fan_out(backup_shard)
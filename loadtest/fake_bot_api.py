@@ -0,0 +1,233 @@
+"""Локальная замена Telegram Bot API для нагрузочного теста.
+
+Понимает методы, которые использует бот (getUpdates, sendMessage, setMyCommands,
+answerCallbackQuery и т.д.), отдаёт файлы по /file/bot<token>/<path>, умеет
+добавлять задержку ответа и отвечать 429 с заданной вероятностью.
+Сервер - минимальный HTTP/1.1 на asyncio, без сторонних зависимостей.
+"""
+import asyncio
+import email
+import json
+import random
+import time
+from urllib.parse import parse_qsl
+
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+# методы, на которые может прийти 429 (как у настоящего Bot API - на отправку)
+RATE_LIMITED_METHODS = {"sendMessage", "editMessageText", "sendDocument", "answerCallbackQuery"}
+
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+
+        # вызывается на каждое сообщение бота: on_bot_message(method, message)
+        self.on_bot_message = None
+        self.ready = asyncio.Event()
+
+        self.calls = {}
+        self.errors_429 = 0
+        self.files = {}
+        self._updates = []
+        self._update_id = 0
+        self._message_id = 0
+        self._new_updates = asyncio.Event()
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    # --- апдейты от "пользователей" ---
+
+    def next_message_id(self) -> int:
+        self._message_id += 1
+        return self._message_id
+
+    def push_update(self, update: dict) -> int:
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self._updates.append(update)
+        self._new_updates.set()
+        return self._update_id
+
+    def add_file(self, file_id: str, content: bytes):
+        self.files[file_id] = content
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                http_method, path, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, content_type, payload = await self._dispatch(http_method, path, headers, body)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # клиент отключился или сервер останавливается
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, http_method: str, path: str, headers: dict, body: bytes):
+        parts = path.lstrip("/").split("/")
+
+        if http_method == "GET" and parts[0] == "file":
+            content = self.files.get(parts[-1])
+            if content is None:
+                return "404 Not Found", "text/plain", b"not found"
+            return "200 OK", "application/octet-stream", content
+
+        method = parts[-1]
+        params = _parse_params(headers.get("content-type", ""), body)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method != "getUpdates" and self.latency:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+        if method in RATE_LIMITED_METHODS and random.random() < self.error_rate:
+            self.errors_429 += 1
+            return "429 Too Many Requests", "application/json", json.dumps({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+
+        handler = getattr(self, f"_api_{method}", None)
+        result = await handler(params) if handler else True
+
+        return "200 OK", "application/json", json.dumps({"ok": True, "result": result}).encode()
+
+    # --- методы Bot API ---
+
+    async def _api_getMe(self, params):
+        return BOT_USER
+
+    async def _api_getUpdates(self, params):
+        self.ready.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # подтверждённые апдейты больше не отдаём
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return self._updates[:limit]
+
+    async def _api_sendMessage(self, params):
+        message = {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+
+        self._notify("sendMessage", message)
+        return message
+
+    async def _api_editMessageText(self, params):
+        message = {
+            "message_id": int(params["message_id"]),
+            "date": int(time.time()),
+            "edit_date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+        if params.get("reply_markup"):
+            message["reply_markup"] = params["reply_markup"]
+
+        self._notify("editMessageText", message)
+        return message
+
+    async def _api_sendDocument(self, params):
+        message = {
+            "message_id": self.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "from": BOT_USER,
+            "document": {"file_id": "doc", "file_unique_id": "doc"},
+        }
+
+        self._notify("sendDocument", message)
+        return message
+
+    async def _api_getFile(self, params):
+        file_id = params["file_id"]
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": len(self.files.get(file_id, b"")),
+            "file_path": f"documents/{file_id}",
+        }
+
+    async def _api_getWebhookInfo(self, params):
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": len(self._updates)}
+
+    def _notify(self, method: str, message: dict):
+        if self.on_bot_message is not None:
+            self.on_bot_message(method, message)
+
+
+def _parse_params(content_type: str, body: bytes) -> dict:
+    # PTB шлёт application/x-www-form-urlencoded (не строковые значения в JSON),
+    # а при отправке файлов - multipart/form-data
+    if content_type.startswith("multipart/form-data"):
+        message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        fields = {}
+        for part in message.get_payload():
+            name = part.get_param("name", header="content-disposition")
+            if part.get_filename() is None:
+                fields[name] = part.get_payload(decode=True).decode()
+        return {name: _json_value(value) for name, value in fields.items()}
+
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+
+    return {name: _json_value(value) for name, value in parse_qsl(body.decode())}
+
+
+def _json_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
@@ -0,0 +1,504 @@
+"""Нагрузочный тест бота целиком: main.py запускается отдельным процессом против
+локального FakeBotAPI, а драйвер изображает тысячи чатов, которые добавляют,
+ищут, удаляют события, загружают расписание и получают напоминания.
+
+Запуск: python loadtest/run.py --chats 1000 --iterations 5
+Используется отдельная временная БД (BOT_DB_PATH), data/bot.db не трогается.
+
+В конце печатаются перцентили задержки ответа на апдейты по шагам сценариев,
+точность напоминаний и потребление CPU/памяти процессом main.py.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import signal
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_bot_api import FakeBotAPI  # noqa: E402
+
+
+MAIN_PY = Path(__file__).resolve().parent.parent / "main.py"
+TZ = ZoneInfo("Europe/Moscow")
+TOKEN = "123456:LOADTEST"
+
+REMINDERS = [
+    (15, "Через 15 минут встреча"),
+    (5, "Через 5 минут встреча"),
+    (0, "Встреча началась"),
+]
+REMINDER_RE = re.compile(r'^(Через 15 минут встреча|Через 5 минут встреча|Встреча началась): "(.*)"')
+
+SETTINGS_INI = """[app]
+file_schedule = schedule.csv
+favorite_locations = loadtest,room
+upload_max_size = 5242880
+upload_max_rows = 10000
+upload_chunk_size = 500
+"""
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class Chat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+        self.inbox = asyncio.Queue()
+        self.events = []
+        self.counter = 0
+
+
+class LoadDriver:
+    def __init__(self, api: FakeBotAPI, args):
+        self.api = api
+        self.args = args
+        self.chats = {}
+        self.latencies = defaultdict(list)
+        self.timeouts = defaultdict(int)
+        self.expected = defaultdict(list)
+        self.lateness = []
+        self.unmatched_reminders = 0
+        self.schedule_file_rows = []
+
+        api.on_bot_message = self.on_bot_message
+
+    # --- сообщения от бота ---
+
+    def on_bot_message(self, method: str, message: dict):
+        chat_id = message["chat"]["id"]
+        text = message.get("text", "")
+
+        match = REMINDER_RE.match(text)
+        if match:
+            fires = self.expected.get((chat_id, match.group(1), match.group(2)))
+            if fires:
+                self.lateness.append(time.time() - fires.pop(0).timestamp())
+            else:
+                self.unmatched_reminders += 1
+            return
+
+        chat = self.chats.get(chat_id)
+        if chat is not None:
+            chat.inbox.put_nowait((method, message))
+
+    def expect_reminders(self, chat_id: int, title: str, start_at: datetime, scheduled_at: float):
+        # бот не ставит напоминания в прошлое; пограничные (в пределах секунды) не ждём
+        for minutes, prefix in REMINDERS:
+            fire = start_at - timedelta(minutes=minutes)
+            if fire.timestamp() > scheduled_at + 1:
+                self.expected[(chat_id, prefix, title)].append(fire)
+
+    def forget_reminders(self, chat_id: int, title: str):
+        for _, prefix in REMINDERS:
+            self.expected.pop((chat_id, prefix, title), None)
+
+    # --- апдейты от пользователя ---
+
+    def message_update(self, chat_id: int, text: str | None = None, document: dict | None = None) -> dict:
+        user = {"id": chat_id, "is_bot": False, "first_name": f"Load {chat_id}"}
+        message = {
+            "message_id": self.api.next_message_id(),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+        }
+        if text is not None:
+            message["text"] = text
+            if text.startswith("/"):
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split(" ")[0])}]
+        if document is not None:
+            message["document"] = document
+
+        return {"message": message}
+
+    def callback_update(self, chat_id: int, message: dict, data: str) -> dict:
+        return {
+            "callback_query": {
+                "id": str(self.api.next_message_id()),
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"Load {chat_id}"},
+                "chat_instance": str(chat_id),
+                "message": message,
+                "data": data,
+            }
+        }
+
+    async def send(self, chat: Chat, step: str, update: dict, expect: str | None = None) -> dict | None:
+        """Отправляет апдейт и ждёт ответ бота в этот чат, замеряя задержку."""
+        while not chat.inbox.empty():
+            chat.inbox.get_nowait()
+
+        t0 = time.monotonic()
+        self.api.push_update(update)
+        deadline = t0 + self.args.timeout
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts[step] += 1
+                return None
+            try:
+                _, message = await asyncio.wait_for(chat.inbox.get(), remaining)
+            except asyncio.TimeoutError:
+                continue
+
+            if expect is None or expect in message.get("text", ""):
+                self.latencies[step].append(time.monotonic() - t0)
+                return message
+
+    async def think(self):
+        # "время на раздумья" пользователя, ускоренное в --speed раз
+        await asyncio.sleep(random.expovariate(1 / self.args.think) / self.args.speed)
+
+    async def reset(self, chat: Chat):
+        # после таймаута выходим из диалога, ответ не ждём
+        self.api.push_update(self.message_update(chat.id, "/cancel"))
+        await asyncio.sleep(1)
+
+    def next_start_at(self) -> datetime:
+        now = datetime.now(TZ).replace(second=0, microsecond=0)
+        return now + timedelta(minutes=random.randint(self.args.min_ahead, self.args.max_ahead))
+
+    # --- сценарии ---
+
+    async def scenario_add(self, chat: Chat):
+        chat.counter += 1
+        title = f"load {chat.id}-{chat.counter}"
+        start_at = self.next_start_at()
+
+        message = await self.send(chat, "add_event", self.message_update(chat.id, "/add_event"), "Введите дату")
+        if message is None:
+            return await self.reset(chat)
+        await self.think()
+
+        date_data = f"date:{start_at.date().isoformat()}"
+        if date_data in str(message.get("reply_markup", "")):
+            update = self.callback_update(chat.id, message, date_data)
+            message = await self.send(chat, "date_button", update, "Введите время")
+        else:
+            update = self.message_update(chat.id, start_at.date().isoformat())
+            message = await self.send(chat, "date", update, "Введите время")
+        if message is None:
+            return await self.reset(chat)
+        await self.think()
+
+        update = self.message_update(chat.id, start_at.strftime("%H:%M"))
+        if await self.send(chat, "time", update, "Введите название") is None:
+            return await self.reset(chat)
+        await self.think()
+
+        message = await self.send(chat, "title", self.message_update(chat.id, title), "Введите место")
+        if message is None:
+            return await self.reset(chat)
+        await self.think()
+
+        if random.random() < 0.5 and "location:" in str(message.get("reply_markup", "")):
+            update = self.callback_update(chat.id, message, "location:loadtest")
+            step = "location_button"
+        else:
+            update = self.message_update(chat.id, f"dion room{chat.id}")
+            step = "location"
+        if await self.send(chat, step, update, "Событие добавлено") is None:
+            return await self.reset(chat)
+
+        chat.events.append(title)
+        self.expect_reminders(chat.id, title, start_at, time.time())
+
+    async def scenario_find(self, chat: Chat):
+        if not chat.events:
+            return await self.scenario_add(chat)
+
+        await self.send(chat, "find", self.message_update(chat.id, f"/find {random.choice(chat.events)}"))
+
+    async def scenario_delete(self, chat: Chat):
+        if not chat.events:
+            return await self.scenario_add(chat)
+
+        title = chat.events.pop(random.randrange(len(chat.events)))
+        message = await self.send(chat, "find", self.message_update(chat.id, f"/find {title}"))
+        if message is None:
+            return
+
+        event_id = None
+        for line in message.get("text", "").splitlines():
+            match = re.match(r"\[(\d+)\]", line)
+            if match and f'"{title}"' in line:
+                event_id = match.group(1)
+        if event_id is None:
+            return
+        await self.think()
+
+        if await self.send(chat, "delete_event", self.message_update(chat.id, "/delete_event"), "Введите ID") is None:
+            return await self.reset(chat)
+        await self.think()
+
+        self.forget_reminders(chat.id, title)
+        if await self.send(chat, "event_id", self.message_update(chat.id, event_id), "удалено") is None:
+            return await self.reset(chat)
+
+    async def scenario_get_schedule(self, chat: Chat):
+        await self.send(chat, "get_schedule", self.message_update(chat.id, "/get_schedule"))
+
+    async def scenario_upload(self, chat: Chat):
+        chat.counter += 1
+        rows = []
+        for i in range(self.args.upload_rows):
+            rows.append((f"import {chat.id}-{chat.counter}-{i}", self.next_start_at()))
+
+        content = "title,location,start_at,timezone\n" + "".join(
+            f"{title},room,{start_at.strftime('%Y-%m-%d %H:%M')},Europe/Moscow\n" for title, start_at in rows
+        )
+        file_id = f"csv-{chat.id}-{chat.counter}"
+        self.api.add_file(file_id, content.encode())
+
+        document = {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_name": "schedule.csv",
+            "mime_type": "text/csv",
+            "file_size": len(content.encode()),
+        }
+        update = self.message_update(chat.id, document=document)
+        if await self.send(chat, "upload", update, "Расписание загружено") is None:
+            return
+
+        scheduled_at = time.time()
+        for title, start_at in rows:
+            self.expect_reminders(chat.id, title, start_at, scheduled_at)
+
+    async def scenario_schedule(self, chat: Chat):
+        if await self.send(chat, "schedule", self.message_update(chat.id, "/schedule"), "Расписание загружено") is None:
+            return
+
+        scheduled_at = time.time()
+        for title, start_at in self.schedule_file_rows:
+            if start_at.timestamp() > scheduled_at:
+                self.expect_reminders(chat.id, title, start_at, scheduled_at)
+
+    async def run_chat(self, chat: Chat, delay: float):
+        await asyncio.sleep(delay)
+        scenarios = list(self.args.mix)
+        weights = [self.args.mix[name] for name in scenarios]
+
+        for _ in range(self.args.iterations):
+            name = random.choices(scenarios, weights)[0]
+            await getattr(self, f"scenario_{name}")(chat)
+            await self.think()
+
+    def write_schedule_file(self, workdir: Path):
+        # общий файл для /schedule: события в пределах окна напоминаний теста
+        self.schedule_file_rows = [(f"shared {i}", self.next_start_at()) for i in range(5)]
+        content = "title,location,start_at,timezone\n" + "".join(
+            f"{title},room,{start_at.strftime('%Y-%m-%d %H:%M')},Europe/Moscow\n"
+            for title, start_at in self.schedule_file_rows
+        )
+        (workdir / "schedule.csv").write_text(content, encoding="utf-8")
+
+    async def run(self):
+        chat_ids = [200000 + i for i in range(self.args.chats)]
+        for chat_id in chat_ids:
+            self.chats[chat_id] = Chat(chat_id)
+
+        t0 = time.monotonic()
+        await asyncio.gather(*(
+            self.run_chat(chat, random.uniform(0, self.args.ramp))
+            for chat in self.chats.values()
+        ))
+        scenarios_time = time.monotonic() - t0
+
+        # ждём последние напоминания
+        fires = [fire.timestamp() for fires in self.expected.values() for fire in fires]
+        if fires:
+            deadline = max(fires) + self.args.grace
+            while time.time() < deadline and any(self.expected.values()):
+                await asyncio.sleep(1)
+
+        return scenarios_time
+
+
+class ResourceMonitor:
+    """Раз в секунду снимает CPU и RSS процесса из /proc (Linux)."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.rss = []
+        self.cpu_start = None
+        self.cpu_end = None
+        self.t_start = None
+        self.t_end = None
+        self._task = None
+
+    def _sample(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status") as f:
+                rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            return
+        # utime + stime, поля 14 и 15 (после имени процесса - с 3-го)
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        now = time.monotonic()
+
+        if self.cpu_start is None:
+            self.cpu_start, self.t_start = cpu, now
+        self.cpu_end, self.t_end = cpu, now
+        self.rss.append(rss / 1024)
+
+    async def _run(self):
+        while True:
+            self._sample()
+            await asyncio.sleep(1)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def report(self) -> str:
+        if not self.rss:
+            return "resources: /proc недоступен, данных нет"
+        cpu_time = self.cpu_end - self.cpu_start
+        wall = max(self.t_end - self.t_start, 1e-9)
+        return (
+            f"main.py: cpu {cpu_time:.1f}s ({cpu_time / wall * 100:.0f}% avg), "
+            f"rss peak {max(self.rss):.0f} MB, last {self.rss[-1]:.0f} MB"
+        )
+
+
+def print_report(driver: LoadDriver, api: FakeBotAPI, monitor: ResourceMonitor, scenarios_time: float):
+    print(f"\nscenarios finished in {scenarios_time:.1f}s")
+    print("\nupdate latency (update queued -> bot reply), ms:")
+    print(f"{'step':>16} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'timeouts':>9}")
+    for step in sorted(set(driver.latencies) | set(driver.timeouts)):
+        values = [v * 1000 for v in driver.latencies[step]] or [0.0]
+        print(
+            f"{step:>16} {len(driver.latencies[step]):>7} {percentile(values, 0.5):>8.0f} "
+            f"{percentile(values, 0.95):>8.0f} {percentile(values, 0.99):>8.0f} {max(values):>8.0f} "
+            f"{driver.timeouts[step]:>9}"
+        )
+
+    missed = sum(len(fires) for fires in driver.expected.values())
+    # часы бота не ускоряются: точность меряется только на коротком окне реального времени
+    print(
+        f"\nreminder punctuality (arrival - scheduled time), ms; real time, "
+        f"events {driver.args.min_ahead}..{driver.args.max_ahead} min ahead:"
+    )
+    if driver.lateness:
+        values = [v * 1000 for v in driver.lateness]
+        print(
+            f"received {len(values)}, missed {missed}, unmatched {driver.unmatched_reminders}; "
+            f"p50 {percentile(values, 0.5):.0f}, p95 {percentile(values, 0.95):.0f}, "
+            f"p99 {percentile(values, 0.99):.0f}, max {max(values):.0f}"
+        )
+    else:
+        print(f"received 0, missed {missed}, unmatched {driver.unmatched_reminders}")
+
+    print("\nfake Bot API:")
+    print(", ".join(f"{method} {count}" for method, count in sorted(api.calls.items())))
+    print(f"injected 429: {api.errors_429}")
+
+    print()
+    print(monitor.report())
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if not hasattr(LoadDriver, f"scenario_{name.strip()}"):
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=5, help="сценариев на чат")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(
+        "add=4,find=2,delete=2,get_schedule=1,upload=1,schedule=1"
+    ))
+    parser.add_argument("--ramp", type=float, default=30, help="чаты стартуют равномерно за столько секунд")
+    parser.add_argument("--think", type=float, default=5, help="среднее время между шагами пользователя, с")
+    parser.add_argument("--speed", type=float, default=10, help="ускорение времени пользователя")
+    parser.add_argument("--min-ahead", type=int, default=1, help="события не раньше чем через N минут")
+    parser.add_argument("--max-ahead", type=int, default=3, help="события не позже чем через N минут")
+    parser.add_argument("--upload-rows", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--timeout", type=float, default=60, help="ожидание ответа бота на шаг, с")
+    parser.add_argument("--grace", type=float, default=30, help="ожидание напоминаний после срока, с")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = Path(tempfile.mkdtemp(prefix="bot-loadtest-"))
+    (workdir / "settings.ini").write_text(SETTINGS_INI, encoding="utf-8")
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    url = await api.start()
+    driver = LoadDriver(api, args)
+    driver.write_schedule_file(workdir)
+
+    env = dict(
+        os.environ,
+        ENV="PROD",
+        PROD_BOT_TOKEN=TOKEN,
+        BOT_API_URL=url,
+        BOT_DB_PATH=str(workdir / "bot.db"),
+        # бот трактует введённое время как локальное, вводим его по Москве
+        TZ="Europe/Moscow",
+        PYTHONUNBUFFERED="1",
+    )
+    log = open(workdir / "bot.log", "wb")
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(MAIN_PY), cwd=workdir, env=env, stdout=log, stderr=asyncio.subprocess.STDOUT
+    )
+    print(f"bot pid {proc.pid}, workdir {workdir}, fake Bot API {url}")
+
+    monitor = ResourceMonitor(proc.pid)
+    try:
+        # ждём первого getUpdates; если бот упал при старте, не ждём все 60 с
+        ready = asyncio.create_task(api.ready.wait())
+        exited = asyncio.create_task(proc.wait())
+        await asyncio.wait({ready, exited}, timeout=60, return_when=asyncio.FIRST_COMPLETED)
+        ready.cancel()
+        exited.cancel()
+        if not api.ready.is_set():
+            reason = f"exited with code {proc.returncode}" if proc.returncode is not None else "no getUpdates in 60 s"
+            raise SystemExit(f"bot failed to start ({reason}), see log: {workdir / 'bot.log'}")
+
+        monitor.start()
+        scenarios_time = await driver.run()
+    finally:
+        monitor.stop()
+        if proc.returncode is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.wait(), 30)
+            except asyncio.TimeoutError:
+                proc.kill()
+        await api.stop()
+        log.close()
+
+    print_report(driver, api, monitor, scenarios_time)
+    print(f"\nbot log: {workdir / 'bot.log'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
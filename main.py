@@ -1,9 +1,29 @@
+import asyncio
+import bisect
+import codecs
 import configparser
 import csv
+import logging
 import os
-from datetime import datetime, timedelta, timezone, date
+import re
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone, date, time
+from itertools import groupby
 from dotenv import load_dotenv
-from telegram import BotCommand, BotCommandScopeChat, BotCommandScopeDefault, InlineKeyboardButton, InlineKeyboardMarkup, Update
+from typing import AsyncIterator, Iterable, Iterator
+import httpx
+from telegram import (
+    BotCommand,
+    BotCommandScopeChat,
+    BotCommandScopeDefault,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.error import Forbidden, RetryAfter, TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -11,6 +31,8 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     ContextTypes,
+    InlineQueryHandler,
+    JobQueue,
     filters,
 )
 from zoneinfo import ZoneInfo
@@ -28,16 +50,39 @@ from db import (
     get_unschedule_events,
     update_event_status_by_id,
     delete_all_events,
-    set_all_events_unscheduled
+    set_all_events_unscheduled,
+    search_events_db,
+    get_events_for_chat_db,
+    start_write_queues,
+    stop_write_queues,
+    backup_db,
+    set_chat_digest_db,
+    get_chat_settings_db,
+    get_digest_only_chats_db,
+    get_digest_events_db,
+    delete_notifications_for_chat_db,
+    set_chat_events_unscheduled_db,
+    delete_expired_digest_only_events,
 )
+from profiler import LoopWatchdog, SamplingProfiler
 
 
 load_dotenv()  # читает .env в текущей директории
 
 DION_URL = "https://dion.vc/event/"
+DEFAULT_TZ = "Europe/Moscow"
 ENV = os.getenv("ENV", "PROD")
 BOT_TOKEN = os.getenv("PROD_BOT_TOKEN") if ENV == "PROD" else os.getenv("TEST_BOT_TOKEN")
+# адрес Bot API, по умолчанию https://api.telegram.org (переопределяется, например, для loadtest)
+BOT_API_URL = os.getenv("BOT_API_URL")
 ASK_DATE, ASK_TIME, ASK_TITLE, ASK_LOCATION, ASK_EVENT_ID = range(5)
+FIND_PAGE_SIZE = 10
+FIND_QUERIES_KEEP = 20  # сколько последних поисков в чате можно листать
+INLINE_PAGE_SIZE = 50  # больше Telegram не принимает за один ответ
+INLINE_CACHE_TIME = 30  # сколько секунд Telegram может сам кэшировать ответ на inline-запрос
+INLINE_CACHE_TTL = 600  # сколько секунд держим собранные inline-результаты у себя
+INLINE_CACHE_USERS = 1000  # для скольких пользователей держим результаты, дальше вытесняем давних
+PROFILE_MAX_SECONDS = 600
 
 BASE_COMMANDS = [
     BotCommand("add_event", "добавить событие"),
@@ -45,6 +90,9 @@ BASE_COMMANDS = [
     BotCommand("clear_schedule", "очистить расписание"),
     BotCommand("schedule", "запланировать"),
     BotCommand("get_schedule", "получить расписание"),
+    BotCommand("find", "найти событие"),
+    BotCommand("digest", "утренний дайджест: on/off"),
+    BotCommand("reminders", "напоминания: all/digest"),
 ]
 
 CONV_COMMANDS = [
@@ -52,6 +100,9 @@ CONV_COMMANDS = [
 ]
 
 config = configparser.ConfigParser()
+logger = logging.getLogger(__name__)
+profiler = SamplingProfiler()
+watchdog = LoopWatchdog()
 
 
 async def set_base_commands(bot):
@@ -72,22 +123,178 @@ async def reset_chat_commands(chat_id: int, bot):
     await bot.delete_my_commands(scope=scope)
 
 
-def read_schedule_csv(filename: str) -> list:
-    meetings = []
-    with open(filename, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            tz = ZoneInfo(row.get("timezone", "Europe/Moscow"))
+def parse_schedule_csv(lines: Iterable[str]) -> Iterator[dict | None]:
+    # построчно разбираем CSV, для некорректных строк отдаём None
+    reader = csv.DictReader(lines)
+    for row in reader:
+        try:
+            tz = ZoneInfo(row.get("timezone") or DEFAULT_TZ)
             dt = datetime.strptime(row["start_at"], "%Y-%m-%d %H:%M")
             dt = dt.replace(tzinfo=tz)
             dt = dt.astimezone(timezone.utc)
 
-            if dt > datetime.now(timezone.utc):
-                meetings.append({
-                    "title": row["title"],
-                    "start_at": dt,
-                    "location": row["location"]
-                })
+            yield {
+                "title": row["title"],
+                "start_at": dt,
+                "location": row["location"]
+            }
+        except (KeyError, TypeError, ValueError):
+            yield None
+
+
+def _ics_unescape(value: str) -> str:
+    # \n, \, \; \\ -> перевод строки и сами символы
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _ics_parse_dt(params: str, value: str) -> datetime:
+    # DTSTART:20260121T143000Z, DTSTART;TZID=Europe/Moscow:20260121T143000, DTSTART;VALUE=DATE:20260121
+    tz_name = DEFAULT_TZ
+    for param in params.split(";"):
+        key, _, param_value = param.partition("=")
+        if key.upper() == "TZID":
+            tz_name = param_value.strip('"')
+
+    if value.endswith("Z"):
+        dt = datetime.strptime(value[:-1], "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    elif "T" in value:
+        dt = datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=ZoneInfo(tz_name))
+    else:
+        dt = datetime.strptime(value, "%Y%m%d").replace(tzinfo=ZoneInfo(tz_name))
+
+    return dt.astimezone(timezone.utc)
+
+
+def _ics_unfold(lines: Iterable[str]) -> Iterator[str]:
+    # склеиваем перенесённые строки (RFC 5545, продолжение начинается с пробела или таба)
+    current = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def parse_schedule_ics(lines: Iterable[str]) -> Iterator[dict | None]:
+    # построчно разбираем iCalendar, берём только VEVENT
+    event = None
+    for line in _ics_unfold(lines):
+        name, _, value = line.partition(":")
+        name, _, params = name.partition(";")
+        name = name.upper()
+
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = {}
+        elif name == "END" and value.upper() == "VEVENT":
+            # на каждый END:VEVENT ровно один результат, на него рассчитывает stream_schedule
+            try:
+                yield {
+                    "title": _ics_unescape(event["SUMMARY"][1]),
+                    "start_at": _ics_parse_dt(*event["DTSTART"]),
+                    "location": _ics_unescape(event.get("LOCATION", ("", ""))[1]),
+                }
+            except (KeyError, TypeError, ValueError):
+                yield None
+            event = None
+        elif event is not None and name in ("SUMMARY", "DTSTART", "LOCATION"):
+            event[name] = (params, value)
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+class _LineFeed:
+    """Итератор строк для парсеров, пополняется по мере скачивания файла."""
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+async def _file_chunks(file_path: str, local: bool) -> AsyncIterator[bytes]:
+    if local:
+        # в local_mode Bot API сервер сам кладёт файл на диск, file_path - путь к нему
+        with open(file_path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, 64 * 1024):
+                yield chunk
+        return
+
+    # отдельный клиент: прокси из настроек Application он не видит, только из окружения (HTTPS_PROXY)
+    async with httpx.AsyncClient() as client:
+        async with client.stream("GET", file_path) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+
+
+async def stream_file_lines(file_path: str, max_size: int, local: bool = False) -> AsyncIterator[str]:
+    # качаем потоком и отдаём построчно, размер считаем по мере получения байтов
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    size = 0
+    tail = ""
+    async with aclosing(_file_chunks(file_path, local)) as chunks:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge()
+            *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+            for line in lines:
+                yield line + "\n"
+
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def stream_schedule(
+    file_path: str, max_size: int, is_ics: bool, local: bool = False
+) -> AsyncIterator[dict | None]:
+    """Разбирает файл расписания по мере скачивания.
+
+    Парсеру отдаём только целиком скачанные записи (VEVENT или строку CSV с учётом
+    кавычек) и держим одну запись про запас: _ics_unfold заглядывает на строку вперёд.
+    """
+    feed = _LineFeed()
+    meetings = parse_schedule_ics(feed) if is_ics else parse_schedule_csv(feed)
+    ready = 0 if is_ics else -1  # у CSV первая запись - заголовок
+    quotes = 0
+
+    async with aclosing(stream_file_lines(file_path, max_size, local)) as lines:
+        async for line in lines:
+            feed.lines.append(line)
+            if is_ics:
+                ready += line.strip().upper() == "END:VEVENT"
+            else:
+                # запись CSV закончилась, если кавычки сбалансированы; пустые строки DictReader пропускает
+                quotes += line.count('"')
+                ready += quotes % 2 == 0 and bool(line.strip("\r\n"))
+
+            while ready > 1:
+                ready -= 1
+                yield next(meetings)
+
+    # файл скачан целиком - разбираем остаток
+    for meeting in meetings:
+        yield meeting
+
+
+def read_schedule_csv(filename: str) -> list:
+    now = datetime.now(timezone.utc)
+    with open(filename, "r", encoding="utf-8") as f:
+        meetings = [m for m in parse_schedule_csv(f) if m and m["start_at"] > now]
 
     return meetings
 
@@ -104,7 +311,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     job = context.job
-    notification = get_notification_by_job(job.name)
+    notification = get_notification_by_job(job.name, job.chat_id)
     cnt = len(get_notifications_by_event_id(notification["event_id"]))
 
     start_at = job.data['start_at'].astimezone(ZoneInfo("Europe/Moscow")).strftime("%Y-%m-%d %H:%M")
@@ -113,12 +320,23 @@ async def reminder_callback(context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(job.chat_id, message)
     if cnt == 1:
         delete_event_by_id(notification["event_id"])
+        invalidate_inline_cache(context.bot_data, job.chat_id)
     else:
-        delete_notification_by_job(job.name)
+        await delete_notification_by_job(job.name, job.chat_id)
 
 
-def add_notifications_for_event(event_id, job_queue):
+async def add_notifications_for_event(event_id, job_queue, digest_only: bool | None = None):
     event_row = get_event_by_id(event_id)
+
+    if digest_only is None:
+        settings = get_chat_settings_db(event_row["chat_id"])
+        digest_only = bool(settings and settings["digest_only"])
+
+    # в режиме "только дайджест" напоминания не ставим, событие попадёт в утренний дайджест
+    if digest_only:
+        await update_event_status_by_id(event_id, 1)
+        return None
+
     start_at_utc = datetime.strptime(event_row["start_at"][:16], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
 
     # три момента напоминаний
@@ -129,6 +347,7 @@ def add_notifications_for_event(event_id, job_queue):
     ]
 
     now = datetime.now(timezone.utc)
+    writes = []
 
     for notify_at, reminder in times:
         # не ставим задачи в прошлое
@@ -149,10 +368,15 @@ def add_notifications_for_event(event_id, job_queue):
             name=f"{event_row['chat_id']}_{notify_at}_{reminder}",
         )
 
-        notification_id = add_notification_db(event_id, reminder, notify_at, job.name)
-        update_event_status_by_id(event_id, 1)
+        writes.append(add_notification_db(event_id, reminder, notify_at, job.name))
+
+    if not writes:
+        return None
+
+    # записи уходят в очередь записи вместе и коммитятся одной пачкой
+    *notification_ids, _ = await asyncio.gather(*writes, update_event_status_by_id(event_id, 1))
 
-    return notification_id
+    return notification_ids[-1]
 
 
 async def schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -163,8 +387,9 @@ async def schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     meetings = read_schedule_csv(file_schedule)
     bulk_insert_events(chat_id, meetings)
+    invalidate_inline_cache(context.bot_data, chat_id)
 
-    schedule_notifications(context.job_queue)
+    await schedule_notifications(context.job_queue)
 
     await update.message.reply_text(
         "Расписание загружено, напоминания будут за 15 минут, 5 минут и в момент начала."
@@ -173,11 +398,88 @@ async def schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # await get_schedule(update, context)
 
 
-def schedule_notifications(job_queue):
+async def upload_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Загрузка расписания из присланного в чат CSV/ICS файла."""
+    chat_id = update.effective_chat.id
+    document = update.message.document
+
+    config.read("settings.ini")
+    max_size = config.getint("app", "upload_max_size", fallback=5 * 1024 * 1024)
+    max_rows = config.getint("app", "upload_max_rows", fallback=10000)
+    chunk_size = config.getint("app", "upload_chunk_size", fallback=500)
+
+    if document.file_size and document.file_size > max_size:
+        await update.message.reply_text(f"Файл слишком большой, максимум {max_size // 1024} КБ.")
+        return
+
+    progress = await update.message.reply_text("Загружаю расписание...")
+
+    # файл качается потоком и разбирается по мере получения, без временных файлов
+    file = await document.get_file()
+    is_ics = (document.file_name or "").lower().endswith(".ics")
+
+    now = datetime.now(timezone.utc)
+    rows = inserted = skipped = 0
+    truncated = too_large = failed = False
+    chunk = []
+
+    try:
+        stream = stream_schedule(file.file_path, max_size, is_ics, context.bot.local_mode)
+        async with aclosing(stream) as meetings:
+            async for meeting in meetings:
+                if rows >= max_rows:
+                    truncated = True
+                    break
+                rows += 1
+
+                if meeting is None or meeting["start_at"] <= now:
+                    skipped += 1
+                    continue
+
+                chunk.append(meeting)
+                if len(chunk) >= chunk_size:
+                    bulk_insert_events(chat_id, chunk)
+                    inserted += len(chunk)
+                    chunk = []
+                    await progress.edit_text(f"Загружаю расписание... добавлено событий: {inserted}")
+    except FileTooLarge:
+        # размер заранее неизвестен - останавливаемся на лимите, уже разобранное сохраняем
+        too_large = True
+    except (httpx.HTTPError, OSError) as e:
+        # в тексте ошибки httpx есть URL файла, а в нём токен бота - URL в лог не пишем
+        failed = True
+        reason = f"HTTP {e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+        logger.warning("Failed to download schedule for chat %s: %s", chat_id, reason)
+
+    if chunk:
+        bulk_insert_events(chat_id, chunk)
+        inserted += len(chunk)
+
+    invalidate_inline_cache(context.bot_data, chat_id)
+
+    # уже вставленные пачки планируем и при ошибке скачивания, иначе они останутся без напоминаний
+    await schedule_notifications(context.job_queue)
+
+    title = "Не удалось скачать файл целиком." if failed else "Расписание загружено."
+    summary = f"{title}\n\nДобавлено событий: {inserted}\nПропущено строк: {skipped}"
+    if truncated:
+        summary += f"\nФайл обрезан: обработаны первые {max_rows} строк."
+    if too_large:
+        summary += f"\nФайл обрезан: больше {max_size // 1024} КБ, остаток не загружен."
+
+    await progress.edit_text(summary)
+
+
+async def schedule_notifications(job_queue):
     unscheduled_events = get_unschedule_events()
+    digest_only_chats = get_digest_only_chats_db()
 
-    for unschedule_event in unscheduled_events:
-        add_notifications_for_event(unschedule_event["id"], job_queue)
+    await asyncio.gather(*(
+        add_notifications_for_event(
+            unschedule_event["id"], job_queue, unschedule_event["chat_id"] in digest_only_chats
+        )
+        for unschedule_event in unscheduled_events
+    ))
 
 
 async def get_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -186,6 +488,9 @@ async def get_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     event_keys = ["event_id", "title", "location", "start_at"]
 
     for job in context.job_queue.jobs():
+        # в очереди есть и служебные задачи (дайджест, профайлер) - берём только напоминания
+        if job.callback is not reminder_callback:
+            continue
         event = {k: job.data[k] for k in event_keys if k in job.data}
         # event = job.data
         if event not in schedule:
@@ -198,6 +503,145 @@ async def get_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(message or "Расписание пусто!")
 
 
+def render_find_page(chat_id: int, text: str, offset: int):
+    # берём на одну строку больше, чтобы понять, есть ли следующая страница
+    rows = search_events_db(chat_id, text, limit=FIND_PAGE_SIZE + 1, offset=offset)
+    has_next = len(rows) > FIND_PAGE_SIZE
+    rows = rows[:FIND_PAGE_SIZE]
+
+    if not rows:
+        return ("Ничего не найдено." if offset == 0 else "Больше ничего не найдено."), None
+
+    message = f"Найдено по запросу \"{text}\":\n\n"
+    for row in rows:
+        start_at = datetime.strptime(row["start_at"][:16], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        start_at = start_at.astimezone(ZoneInfo(DEFAULT_TZ)).strftime("%Y-%m-%d %H:%M")
+        message += " ".join([f"[{row['id']}]", start_at, f"\"{row['title']}\"", row["location"] or "", "\n\n"])
+
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("« Назад", callback_data=f"find:{max(offset - FIND_PAGE_SIZE, 0)}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Далее »", callback_data=f"find:{offset + FIND_PAGE_SIZE}"))
+
+    return message, InlineKeyboardMarkup([buttons]) if buttons else None
+
+
+async def find(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    text = " ".join(context.args).strip()
+
+    if not text:
+        await update.message.reply_text("Укажите, что искать: /find <текст>")
+        return
+
+    message, reply_markup = render_find_page(chat_id, text, 0)
+    sent = await update.message.reply_text(message, reply_markup=reply_markup)
+
+    # в callback_data кнопок помещается только смещение, поэтому запрос храним в chat_data
+    # по id сообщения с результатами: у каждого поиска свои кнопки
+    queries = context.chat_data.setdefault("find_queries", {})
+    queries[sent.message_id] = text
+    while len(queries) > FIND_QUERIES_KEEP:
+        del queries[next(iter(queries))]
+
+
+async def find_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Переключение страниц результатов /find."""
+    chat_id = update.effective_chat.id
+    query = update.callback_query
+    await query.answer()
+
+    text = context.chat_data.get("find_queries", {}).get(query.message.message_id)
+    if not text:
+        await query.edit_message_text("Поиск устарел, повторите /find")
+        return
+
+    _, value = query.data.split(":", 1)
+    message, reply_markup = render_find_page(chat_id, text, int(value))
+    await query.edit_message_text(message, reply_markup=reply_markup)
+
+
+def invalidate_inline_cache(bot_data: dict, chat_id: int | None = None):
+    # сбрасываем кэш inline-результатов чата (или всех чатов) после изменения событий
+    cache = bot_data.setdefault("inline_cache", {})
+    if chat_id is None:
+        cache.clear()
+    else:
+        cache.pop(chat_id, None)
+
+
+def build_inline_results(chat_id: int, now: datetime) -> list:
+    # готовим результаты один раз на пользователя, дальше отдаём их из кэша
+    results = []
+    for row in get_events_for_chat_db(chat_id):
+        start_at_utc = datetime.strptime(row["start_at"][:16], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        if start_at_utc <= now:
+            continue
+        start_at = start_at_utc.astimezone(ZoneInfo(DEFAULT_TZ)).strftime("%Y-%m-%d %H:%M")
+        location = row["location"] or ""
+
+        article = InlineQueryResultArticle(
+            id=str(row["id"]),
+            title=row["title"],
+            description=f"{start_at} {location}".strip(),
+            input_message_content=InputTextMessageContent(
+                f"\"{row['title']}\"\n\nStart at: {start_at}\nLocation: {location}"
+            ),
+            url=location if location.startswith("http") else None,
+        )
+        search_text = f"{row['title']} {location}".lower()
+        results.append((start_at_utc, search_text, article))
+
+    return results
+
+
+def get_inline_results(bot_data: dict, user_id: int, now: datetime) -> list:
+    # кэш живёт INLINE_CACHE_TTL и держит не больше INLINE_CACHE_USERS пользователей (LRU);
+    # dict хранит порядок вставки, поэтому свежие записи переставляем в конец
+    cache = bot_data.setdefault("inline_cache", {})
+    entry = cache.pop(user_id, None)
+    if entry is None or entry[0] <= now:
+        entry = (now + timedelta(seconds=INLINE_CACHE_TTL), build_inline_results(user_id, now))
+
+    # результаты отсортированы по началу, прошедшие события выкидываем из головы списка
+    expires_at, results = entry
+    past = bisect.bisect_right(results, now, key=lambda result: result[0])
+    if past:
+        results = results[past:]
+
+    cache[user_id] = (expires_at, results)
+    while len(cache) > INLINE_CACHE_USERS:
+        del cache[next(iter(cache))]
+
+    return results
+
+
+async def inline_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Inline-режим: @bot <запрос> - ближайшие события пользователя."""
+    inline_query = update.inline_query
+    # события пользователя - это события его личного чата с ботом
+    user_id = inline_query.from_user.id
+    text = inline_query.query.strip().lower()
+    offset = int(inline_query.offset or 0)
+
+    now = datetime.now(timezone.utc)
+    matched = [
+        article
+        for _, search_text, article in get_inline_results(context.bot_data, user_id, now)
+        if text in search_text
+    ]
+    page = matched[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if len(matched) > offset + INLINE_PAGE_SIZE else ""
+
+    await inline_query.answer(
+        page,
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=True,
+        next_offset=next_offset,
+    )
+
+
 async def clear_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Get a list of all currently scheduled jobs
     all_jobs = context.job_queue.jobs()
@@ -207,10 +651,198 @@ async def clear_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
         job.remove()
 
     delete_all_events()
+    invalidate_inline_cache(context.bot_data)
 
     await update.message.reply_text("Расписание очищено!")
 
 
+def render_digest(events) -> str:
+    message = "Встречи на сегодня:\n\n"
+    for event in events:
+        start_at = datetime.strptime(event["start_at"][:16], "%Y-%m-%d %H:%M").replace(tzinfo=timezone.utc)
+        start_at = start_at.astimezone(ZoneInfo(DEFAULT_TZ)).strftime("%H:%M")
+        message += " ".join([start_at, f"\"{event['title']}\"", event["location"] or "", "\n"])
+
+    return message
+
+
+async def send_paced(bot, messages, rate: float):
+    """Отправляет сообщения не быстрее rate в секунду, на 429 ждёт и повторяет."""
+    for chat_id, text in messages:
+        while True:
+            try:
+                await bot.send_message(chat_id, text)
+                break
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                await asyncio.sleep(retry_after.total_seconds() if isinstance(retry_after, timedelta) else retry_after)
+            except Forbidden:
+                # бота удалили из чата или заблокировали
+                break
+            except TelegramError as e:
+                # ошибка одного чата не должна оставлять без дайджеста остальных
+                logger.warning("Failed to send digest to chat %s: %s", chat_id, e)
+                break
+
+        await asyncio.sleep(1 / rate)
+
+
+async def digest_callback(context: ContextTypes.DEFAULT_TYPE):
+    """Утренний дайджест: один запрос по всем чатам и один проход по результату."""
+    config.read("settings.ini")
+    rate = config.getfloat("digest", "rate", fallback=20)
+
+    # события "только дайджест" никто не удалит напоминанием, чистим прошедшие здесь;
+    # события остальных чатов удаляет reminder_callback после последнего напоминания
+    delete_expired_digest_only_events()
+
+    tz = ZoneInfo(DEFAULT_TZ)
+    now = datetime.now(tz)
+    end_of_day = datetime.combine(now.date() + timedelta(days=1), time(0, 0), tzinfo=tz)
+
+    rows = get_digest_events_db(now, end_of_day)
+    messages = [
+        (chat_id, render_digest(events))
+        for chat_id, events in groupby(rows, key=lambda row: row["chat_id"])
+    ]
+
+    await send_paced(context.bot, messages, rate)
+
+
+def schedule_digest(job_queue: JobQueue):
+    config.read("settings.ini")
+    digest_time = datetime.strptime(config.get("digest", "time", fallback="09:00"), "%H:%M").time()
+
+    job_queue.run_daily(
+        digest_callback,
+        time=digest_time.replace(tzinfo=ZoneInfo(DEFAULT_TZ)),
+        name="daily_digest",
+    )
+
+
+async def digest(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    value = context.args[0].lower() if context.args else ""
+
+    if value not in ("on", "off"):
+        await update.message.reply_text("Использование: /digest on или /digest off")
+        return
+
+    settings = get_chat_settings_db(chat_id)
+    digest_only = bool(settings and settings["digest_only"])
+
+    if value == "off" and digest_only:
+        await update.message.reply_text(
+            "Сейчас включён режим \"только дайджест\". Сначала верните напоминания: /reminders all"
+        )
+        return
+
+    set_chat_digest_db(chat_id, 1 if value == "on" else 0, int(digest_only))
+    await update.message.reply_text("Утренний дайджест включён." if value == "on" else "Утренний дайджест выключен.")
+
+
+async def reminders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    job_queue = context.job_queue
+    value = context.args[0].lower() if context.args else ""
+
+    if value not in ("all", "digest"):
+        await update.message.reply_text(
+            "Использование: /reminders all - напоминания за 15, 5 минут и в начале встречи, "
+            "/reminders digest - только утренний дайджест"
+        )
+        return
+
+    if value == "digest":
+        # снимаем уже поставленные напоминания чата
+        for job in job_queue.jobs():
+            if job.chat_id == chat_id and job.callback is reminder_callback:
+                job.schedule_removal()
+        delete_notifications_for_chat_db(chat_id)
+        set_chat_digest_db(chat_id, 1, 1)
+
+        await update.message.reply_text("Напоминания выключены, события будут приходить в утреннем дайджесте.")
+    else:
+        settings = get_chat_settings_db(chat_id)
+        if not (settings and settings["digest_only"]):
+            # напоминания и так включены, повторная постановка их бы задвоила
+            await update.message.reply_text("Напоминания уже включены.")
+            return
+
+        set_chat_digest_db(chat_id, settings["digest_enabled"], 0)
+
+        # заново ставим напоминания по событиям чата, начиная с чистого листа
+        for job in job_queue.jobs():
+            if job.chat_id == chat_id and job.callback is reminder_callback:
+                job.schedule_removal()
+        delete_notifications_for_chat_db(chat_id)
+        set_chat_events_unscheduled_db(chat_id)
+        await schedule_notifications(job_queue)
+
+        await update.message.reply_text("Напоминания за 15 минут, 5 минут и в момент начала включены.")
+
+
+def is_admin(chat_id: int) -> bool:
+    config.read("settings.ini")
+    admin_chat_ids = config.get("admin", "chat_ids", fallback="")
+    return str(chat_id) in [value.strip() for value in admin_chat_ids.split(",")]
+
+
+async def send_profile(bot, chat_id: int):
+    collapsed = profiler.stop()
+    if not collapsed:
+        await bot.send_message(chat_id, "Профайлер не успел снять ни одного стека.")
+        return
+
+    await bot.send_document(
+        chat_id,
+        document=collapsed.encode("utf-8"),
+        filename="profile.collapsed",
+        caption="Профиль в формате collapsed stacks (flamegraph.pl, speedscope).",
+    )
+
+
+async def profile_done(context: ContextTypes.DEFAULT_TYPE):
+    await send_profile(context.bot, context.job.chat_id)
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Админская команда: /profile <секунды> или /profile stop."""
+    chat_id = update.effective_chat.id
+    job_queue = context.job_queue
+
+    if not is_admin(chat_id):
+        return
+
+    value = context.args[0].lower() if context.args else ""
+
+    if value == "stop":
+        jobs = job_queue.get_jobs_by_name("profile")
+        if not jobs:
+            await update.message.reply_text("Профайлер не запущен.")
+            return
+        for job in jobs:
+            job.schedule_removal()
+        await send_profile(context.bot, jobs[0].chat_id)
+        return
+
+    try:
+        seconds = int(value)
+    except ValueError:
+        await update.message.reply_text("Использование: /profile <секунды> или /profile stop")
+        return
+    seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+
+    if profiler.running:
+        await update.message.reply_text("Профайлер уже запущен.")
+        return
+
+    # профилируем все потоки, через seconds секунд отправим результат
+    profiler.start()
+    job_queue.run_once(profile_done, when=seconds, chat_id=chat_id, name="profile")
+    await update.message.reply_text(f"Профайлер запущен на {seconds} с.")
+
+
 async def add_event(update: Update, context: ContextTypes.DEFAULT_TYPE):
     today = date.today()
     tomorrow = today + timedelta(days=1)
@@ -321,10 +953,11 @@ async def ask_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     event = context.user_data["new_event"]
 
     event_id = add_event_db(chat_id, event["title"], event["location"], event["start_at"])
+    invalidate_inline_cache(context.bot_data, chat_id)
 
     event["event_id"] = event_id
 
-    add_notifications_for_event(event_id, context.job_queue)
+    await add_notifications_for_event(event_id, context.job_queue)
     await reset_chat_commands(chat_id, bot)
 
     reply_message = (
@@ -357,10 +990,11 @@ async def ask_location_from_button(update: Update, context: ContextTypes.DEFAULT
     event = context.user_data["new_event"]
 
     event_id = add_event_db(chat_id, event["title"], event["location"], event["start_at"])
+    invalidate_inline_cache(context.bot_data, chat_id)
 
     event["event_id"] = event_id
 
-    add_notifications_for_event(event_id, context.job_queue)
+    await add_notifications_for_event(event_id, context.job_queue)
     await reset_chat_commands(chat_id, bot)
 
     reply_message = (
@@ -410,6 +1044,7 @@ async def ask_event_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await update.message.reply_text("Введено некорректное значение идентифкатора события.")
         return ASK_EVENT_ID
 
+    event_row = get_event_by_id(event_id)
     notifications = get_notifications_by_event_id(event_id)
 
     for notification in notifications:
@@ -418,6 +1053,8 @@ async def ask_event_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             job.schedule_removal()
 
     delete_event_by_id(event_id)
+    if event_row:
+        invalidate_inline_cache(context.bot_data, event_row["chat_id"])
 
     await reset_chat_commands(chat_id, bot)
     await update.message.reply_text(f"Событие [{event_id}] удалено.")
@@ -425,12 +1062,30 @@ async def ask_event_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     return ConversationHandler.END
 
 
+async def backup_callback(context: ContextTypes.DEFAULT_TYPE):
+    config.read("settings.ini")
+    backup_dir = config.get("backup", "dir", fallback="data/backups")
+    keep = config.getint("backup", "keep", fallback=3)
+
+    # бэкап идёт в отдельном потоке из снимка WAL и не блокирует loop и запись в БД
+    await asyncio.to_thread(backup_db, backup_dir, keep=keep)
+
+
+def schedule_backup(job_queue: JobQueue):
+    config.read("settings.ini")
+    if not config.getboolean("backup", "enabled", fallback=False):
+        return
+
+    interval = config.getint("backup", "interval_min", fallback=60)
+    job_queue.run_repeating(backup_callback, interval=interval * 60, first=interval * 60, name="backup")
+
+
 async def restore_scheduled_jobs(application):
     # сбрасываем у всех событий флаг is_scheduled = 0
     set_all_events_unscheduled()
 
     # планируем все незапланированные события
-    schedule_notifications(application.job_queue)
+    await schedule_notifications(application.job_queue)
 
 
 async def post_init(application: Application) -> None:
@@ -443,23 +1098,61 @@ async def post_init(application: Application) -> None:
     init_db(True if ENV == "TEST" else False)  # создаём таблицы, если их нет
     # init_db(False)
 
-    # 3. Восстанавливаем уведомления
+    # 3. Запускаем очереди записи в БД (по одной на шард)
+    start_write_queues()
+
+    # 4. Восстанавливаем уведомления
     await restore_scheduled_jobs(application)
 
+    # 5. Планируем утренний дайджест
+    schedule_digest(application.job_queue)
+
+    # 6. Сторож задержек event loop, если включён
+    config.read("settings.ini")
+    if config.getboolean("watchdog", "enabled", fallback=False):
+        watchdog.threshold = config.getint("watchdog", "threshold_ms", fallback=200) / 1000
+        watchdog.start()
+
+    # 7. Онлайн-бэкап БД, если включён
+    schedule_backup(application.job_queue)
+
+
+async def post_shutdown(application: Application) -> None:
+    await watchdog.stop()
+
+    # дописываем в БД всё, что осталось в очереди записи
+    await stop_write_queues()
+
 
 def main():
 
-    app = (
+    builder = (
         Application.builder()
         .token(BOT_TOKEN)
         .post_init(post_init) # Бот сам вызовет это при старте
-        .build()
+        .post_shutdown(post_shutdown)
     )
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+
+    app = builder.build()
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("schedule", schedule))
     app.add_handler(CommandHandler("get_schedule", get_schedule))
+    app.add_handler(CommandHandler("find", find))
+    app.add_handler(CallbackQueryHandler(find_page, pattern=r"^find:\d+$"))
+    app.add_handler(InlineQueryHandler(inline_schedule))
+    app.add_handler(CommandHandler("digest", digest))
+    app.add_handler(CommandHandler("reminders", reminders))
+    app.add_handler(CommandHandler("profile", profile))
     app.add_handler(CommandHandler("clear_schedule", clear_schedule))
+    app.add_handler(
+        MessageHandler(
+            filters.Document.FileExtension("csv") | filters.Document.FileExtension("ics"),
+            upload_schedule,
+        )
+    )
 
     add_event_conv_handler = ConversationHandler(
         entry_points=[CommandHandler("add_event", add_event)],
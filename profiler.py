@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер: фоновый поток раз в interval снимает стеки всех
+    потоков (event loop, воркеры asyncio.to_thread и т.д.) и считает одинаковые стеки.
+
+    Результат stop() - collapsed stacks ("thread:MainThread;a;b;c 42" на строку), их
+    понимают flamegraph.pl, speedscope и inferno. Пока профайлер не запущен, потока нет.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._samples = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: int | None = None):
+        if self._thread is not None:
+            return
+        # по умолчанию профилируем все потоки, кроме самого профайлера
+        self._samples = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        if self._thread is None:
+            return ""
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        return "".join(f"{stack} {count}\n" for stack, count in self._samples.most_common())
+
+    def _run(self, target: int | None):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (target is not None and ident != target):
+                    continue
+                if ident not in names:
+                    # имена обновляем, только когда появился новый поток
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(ident, ident)}")
+                self._samples[";".join(reversed(stack))] += 1
+
+
+class LoopWatchdog:
+    """Сторож event loop: задача в loop раз в interval отмечается и меряет свою
+    задержку, а фоновый поток, увидев, что отметки нет дольше threshold, пишет в лог
+    стек кода, который сейчас блокирует loop.
+    """
+
+    def __init__(self, threshold: float = 0.2, interval: float = 0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self._heartbeat = 0.0
+        self._loop_thread = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._thread.join()
+        self._task = None
+        self._thread = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+
+            lag = now - expected
+            if lag > self.threshold:
+                logger.warning("Event loop lag: %.0f ms", lag * 1000)
+
+    def _watch(self):
+        reported = 0.0
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat <= self.threshold or reported == heartbeat:
+                continue
+
+            # один стек на одну блокировку
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                stack = "".join(traceback.format_stack(frame))
+                logger.warning(
+                    "Event loop blocked for more than %.0f ms, stack:\n%s", self.threshold * 1000, stack
+                )